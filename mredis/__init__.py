@@ -1,5 +1,12 @@
 from mredis.client import MRedis
-from mredis.exceptions import InvalidHashMethod, UnextendedRedisCommand
+from mredis.counters import ShardedCounter
+from mredis.exceptions import InvalidHashMethod, InvalidSlotConfiguration
+from mredis.exceptions import UnextendedRedisCommand
+from mredis.loader import BulkLoader, InvalidRecord, LoadReport
+from mredis.snapshot import export_snapshot, import_snapshot
 
 __version__ = '0.2'
-__all__ = ['MRedis', 'InvalidHashMethod', 'UnextendedRedisCommand']
+__all__ = ['MRedis', 'InvalidHashMethod', 'InvalidSlotConfiguration',
+           'UnextendedRedisCommand', 'BulkLoader', 'InvalidRecord',
+           'LoadReport', 'export_snapshot', 'import_snapshot',
+           'ShardedCounter']
@@ -1,12 +1,21 @@
 "mredis is wrapper for adding multiple server hashing to the redis client."
 
 from binascii import crc32
+import os
+from random import random
 import redis
 
+from mredis.exceptions import InvalidHashMethod, InvalidSlotConfiguration
+from mredis.slots import SLOT_COUNT, build_slot_table, key_slot
+from mredis.stats import KeyStats
+from mredis.utils import fan_out
 
-class MRedis:
+HASH_METHODS = ['standard', 'slots']
 
-    def __init__(self, config, hash_method='standard'):
+
+class MRedis(object):
+
+    def __init__(self, config, hash_method='standard', sample_rate=0):
         """
         Expects a list of dictionaries containing host, port, db:
 
@@ -14,37 +23,279 @@ class MRedis:
                    {'host': 'localhost', 'port': 6380, 'db': 0}]
 
         mr = mredis.MRedis(servers)
-        """
 
-        self.pool = redis.ConnectionPool()
-        self.servers = []
+        With the 'slots' hash method keys are routed by Redis Cluster
+        compatible CRC16 slots. Each server may list the slots it owns,
+        otherwise the 16384 slots are split evenly in server order:
 
-        if hash_method not in ['standard']:
-            raise mredis.exceptions.InvalidHashMethod
+        servers = [{'host': 'localhost', 'port': 6379, 'db': 0,
+                    'slots': ['0-8191']},
+                   {'host': 'localhost', 'port': 6380, 'db': 0,
+                    'slots': ['8192-16383']}]
 
-        self.hash_method = hash_method
+        mr = mredis.MRedis(servers, 'slots')
 
-        for server in config:
+        A ``sample_rate`` between 0 and 1 records that fraction of routed
+        keys for hot key and server imbalance reporting with get_key_stats.
 
-            self.servers.append(redis.Redis(host=server['host'],
-                                            port=server['port'],
-                                            db=server['db'],
-                                            connection_pool=self.pool))
+        Each server gets its own connection pool. When the process forks the
+        child drops the pools inherited from its parent and creates new ones
+        the first time the servers are used.
+        """
+
+        if hash_method not in HASH_METHODS:
+            raise InvalidHashMethod
+
+        self.hash_method = hash_method
+        self.slots = None
+        if hash_method == 'slots':
+            self.slots = build_slot_table(config)
+
+        self.key_stats = None
+        if sample_rate:
+            if not 0 < sample_rate <= 1:
+                raise ValueError('sample_rate must be greater than 0 and at '
+                                 'most 1')
+            self.key_stats = KeyStats(len(config), sample_rate)
+
+        self.config = config
+        self.pid = None
+        self._connect()
+
+    def _connect(self):
+        """
+        Create a connection pool and client for each server, owned by the
+        current process
+        """
+
+        pools = []
+        servers = []
+        for server in self.config:
+            pool = redis.ConnectionPool(host=server['host'],
+                                        port=server['port'],
+                                        db=server['db'])
+            pools.append(pool)
+            servers.append(redis.Redis(host=server['host'],
+                                       port=server['port'],
+                                       db=server['db'],
+                                       connection_pool=pool))
+
+        # Statistics inherited from the parent may have their lock held by a
+        # thread that only exists in the parent, so the child starts afresh
+        if self.pid is not None and self.key_stats is not None:
+            self.key_stats = KeyStats(len(self.config),
+                                      self.key_stats.sample_rate)
+
+        # The inherited pools are dropped rather than disconnected, closing
+        # them would shut down the sockets still in use by the parent
+        self.pools = pools
+        self._servers = servers
+        self.pid = os.getpid()
+
+    def _check_pid(self):
+        "Reconnect if the process has forked since the pools were created"
+
+        if self.pid != os.getpid():
+            self._connect()
+
+    @property
+    def servers(self):
+        "Return the redis clients, reconnecting if the process has forked"
+
+        self._check_pid()
+        return self._servers
+
+    @servers.setter
+    def servers(self, servers):
+        """
+        Replace the redis clients, adopting their connection pools. The
+        config is rebuilt from each pool's host, port and db so a forked child
+        reconnects to these servers, and sampled key statistics start afresh.
+        """
+
+        servers = list(servers)
+        if self.slots is not None and max(self.slots) >= len(servers):
+            raise InvalidSlotConfiguration('Slots are assigned to server %i '
+                                           'but only %i servers were given' %
+                                           (max(self.slots), len(servers)))
+
+        config = []
+        for server in servers:
+            kwargs = server.connection_pool.connection_kwargs
+            config.append({'host': kwargs.get('host', 'localhost'),
+                           'port': kwargs.get('port', 6379),
+                           'db': kwargs.get('db', 0)})
+
+        if self.key_stats is not None:
+            self.key_stats = KeyStats(len(servers), self.key_stats.sample_rate)
+
+        self.config = config
+        self.pools = [server.connection_pool for server in servers]
+        self._servers = servers
+        self.pid = os.getpid()
 
     ### MRedis Specific Parts ###
     def get_node_offset(self, key):
         "Return the redis node list offset to use"
 
+        offset = self._route(key)
+        if self.key_stats is not None and \
+                random() < self.key_stats.sample_rate:
+            self._check_pid()
+            self.key_stats.record(key, offset)
+        return offset
+
+    def _route(self, key):
+        "Return the redis node list offset for ``key`` without sampling it"
+
         if self.hash_method == 'standard':
             c = crc32(key) >> 16 & 0x7fff
             return c % len(self.servers)
 
+        if self.hash_method == 'slots':
+            return self.slots[key_slot(key)]
+
         raise InvalidHashMethod
 
+    def get_slot(self, key):
+        "Return the Redis Cluster compatible slot for ``key``"
+
+        return key_slot(key)
+
+    def assign_slots(self, start, end, offset):
+        """
+        Move the slots from ``start`` to ``end`` inclusive to the server at
+        ``offset`` in the server list. Keys already stored in those slots are
+        not migrated.
+        """
+
+        if self.slots is None:
+            raise InvalidHashMethod
+        if not 0 <= start <= end < SLOT_COUNT:
+            raise InvalidSlotConfiguration('Invalid slot range %i-%i' %
+                                           (start, end))
+        if not 0 <= offset < len(self.servers):
+            raise InvalidSlotConfiguration('Invalid server offset %i' %
+                                           offset)
+        self.slots[start:end + 1] = [offset] * (end - start + 1)
+
+    def get_slot_ranges(self):
+        """
+        Return the inclusive (start, end) slot ranges owned by each server in
+        a dictionary keyed by server
+        """
+
+        if self.slots is None:
+            raise InvalidHashMethod
+
+        response = {}
+        for server in self.servers:
+            response[self.get_server_key(server)] = []
+        start = 0
+        for slot in range(1, SLOT_COUNT + 1):
+            if slot == SLOT_COUNT or self.slots[slot] != self.slots[start]:
+                server = self.servers[self.slots[start]]
+                response[self.get_server_key(server)].append((start,
+                                                              slot - 1))
+                start = slot
+        return response
+
+    def get_slot_keys(self, slot, pattern="*"):
+        """
+        Returns a list of keys matching ``pattern`` in ``slot`` from the server
+        that owns it
+        """
+
+        if self.slots is None:
+            raise InvalidHashMethod
+        if not 0 <= slot < SLOT_COUNT:
+            raise InvalidSlotConfiguration('Invalid slot %i' % slot)
+
+        server = self.servers[self.slots[slot]]
+        return [key for key in server.scan_iter(match=pattern)
+                if key_slot(key) == slot]
+
+    def get_slot_counts(self, pattern="*"):
+        """
+        Returns the number of keys matching ``pattern`` in each slot that
+        holds any, scanning all servers in parallel
+        """
+
+        def count_slots(server):
+            counts = {}
+            for key in server.scan_iter(match=pattern):
+                slot = key_slot(key)
+                counts[slot] = counts.get(slot, 0) + 1
+            return counts
+
+        response = {}
+        for counts in fan_out(count_slots, self.servers):
+            for slot, count in counts.items():
+                response[slot] = response.get(slot, 0) + count
+        return response
+
+    def get_key_stats(self, count=10):
+        """
+        Return the ``count`` hottest sampled keys with their estimated number
+        of requests, the estimated requests and key bytes routed to each
+        server keyed by server and the ratio of the busiest server's requests
+        to the mean
+        """
+
+        self._check_pid()
+        if self.key_stats is None:
+            return None
+
+        nodes, imbalance = self.key_stats.node_stats()
+        servers = {}
+        for server, (requests, key_bytes) in zip(self._servers, nodes):
+            servers[self.get_server_key(server)] = {'requests': requests,
+                                                    'bytes': key_bytes}
+        return {'hot_keys': self.key_stats.hot_keys(count),
+                'servers': servers,
+                'imbalance': imbalance}
+
+    def reset_key_stats(self):
+        "Clear the sampled key and server statistics"
+
+        self._check_pid()
+        if self.key_stats is not None:
+            self.key_stats.reset()
+
+    def warm_up(self, connections=1):
+        """
+        Open ``connections`` connections to each server in parallel so the
+        first requests, such as those right after a fork, do not pay the
+        connect latency. Returns the number of connections opened in a
+        dictionary keyed by server.
+        """
+
+        servers = self.servers
+
+        def connect(pool):
+            opened = []
+            try:
+                for x in range(connections):
+                    connection = pool.get_connection('PING')
+                    opened.append(connection)
+                    connection.connect()
+            finally:
+                for connection in opened:
+                    pool.release(connection)
+            return len(opened)
+
+        response = {}
+        for server, count in zip(servers, fan_out(connect, self.pools)):
+            response[self.get_server_key(server)] = count
+        return response
+
     def get_server_key(self, server):
         "Return a string of server:port:db"
 
-        return "%s:%i:%i" % (server.host, server.port, server.db)
+        kwargs = server.connection_pool.connection_kwargs
+        return "%s:%i:%i" % (kwargs.get('host', 'localhost'),
+                             kwargs.get('port', 6379),
+                             kwargs.get('db', 0))
 
     #### SERVER INFORMATION ####
     def bgrewriteaof(self):
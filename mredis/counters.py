@@ -0,0 +1,233 @@
+"""
+Sharded counters for write-hot keys.
+
+A logical counter is split into sub-keys placed on different servers so that
+increments are spread across them instead of all landing on the one server
+the counter key hashes to. Reading the counter sums the sub-keys with one
+pipeline per server, in parallel.
+
+Sub-key names are chosen for the current server list and hash method, so the
+counter must be read with the same topology it was written with.
+"""
+
+import itertools
+import os
+import random
+import threading
+
+from mredis.utils import encode_key, fan_out
+
+# Attempts made to find a sub-key that hashes to a given server
+_PLACEMENT_ATTEMPTS = 1000
+
+
+class ShardedCounter:
+
+    def __init__(self, mredis, name, shards=None, mode='random',
+                 flush_interval=None):
+        """
+        Expects an MRedis instance and the counter ``name``. ``shards``
+        defaults to one sub-key per server.
+
+        ``mode`` picks the sub-key for each increment, 'random' for a random
+        sub-key or 'thread' to pin each thread to a sub-key.
+
+        With a ``flush_interval`` in seconds increments are buffered locally
+        and written in a batch by a background thread at that interval, so
+        get may lag behind by up to ``flush_interval`` seconds.
+
+        counter = mredis.ShardedCounter(mr, 'pageviews', 8)
+        counter.incr()
+        print counter.get()
+        """
+
+        if mode not in ['random', 'thread']:
+            raise ValueError('Invalid sharded counter mode: %s' % mode)
+
+        self.mredis = mredis
+        self.name = name
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self.keys = self._place(shards or len(mredis.servers))
+
+        self._local = threading.local()
+        self._thread_shards = itertools.count()
+        self._start()
+
+    def _start(self):
+        """
+        Set up the buffer and background flush thread for the current
+        process. After a fork the child discards the increments buffered by
+        its parent, which the parent still flushes itself.
+        """
+
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._stop = threading.Event()
+        self._flusher = None
+        if self.flush_interval:
+            self._flusher = threading.Thread(target=self._flush_loop)
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def _place(self, shards):
+        """
+        Return ``shards`` sub-key names as bytes, spread round robin across
+        the servers. Names whose hash tag pins them to one server fall back
+        to wherever they hash.
+        """
+
+        servers = len(self.mredis.servers)
+        keys = []
+        suffix = 0
+        for shard in range(shards):
+            target = shard % servers
+            for attempt in range(_PLACEMENT_ATTEMPTS):
+                key = encode_key('%s:shard:%i' % (self.name, suffix))
+                suffix += 1
+                # Probes are not requests, so skip key sampling
+                if self.mredis._route(key) == target:
+                    break
+            keys.append(key)
+        return keys
+
+    def _choose(self):
+        "Return the sub-key to increment"
+
+        if self.mode == 'random':
+            return random.choice(self.keys)
+
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = next(self._thread_shards) % len(self.keys)
+            self._local.shard = shard
+        return self.keys[shard]
+
+    def incr(self, amount=1):
+        "Increments the counter by ``amount``"
+
+        key = self._choose()
+        if not self.flush_interval:
+            self.mredis.incr(key, amount)
+            return
+
+        if self._pid != os.getpid():
+            self._start()
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + amount
+
+    def decr(self, amount=1):
+        "Decrements the counter by ``amount``"
+
+        self.incr(-amount)
+
+    def get(self):
+        """
+        Return the value of the counter, summing the sub-keys on all servers
+        in parallel. Buffered increments not yet flushed are not included.
+        """
+
+        total = 0
+        for values in self._fan_out('GET', dict.fromkeys(self.keys)):
+            for value in values:
+                if value is not None:
+                    total += int(value)
+        return total
+
+    def flush(self):
+        "Write any buffered increments to the servers"
+
+        if self._pid != os.getpid():
+            self._start()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        def increment(node):
+            offset, node_keys = node
+            try:
+                results = self._execute(offset, 'INCRBY', node_keys, pending,
+                                        raise_on_error=False)
+            except Exception as error:
+                return [(key, error) for key in node_keys]
+            return [(key, result) for key, result in zip(node_keys, results)
+                    if isinstance(result, Exception)]
+
+        failures = []
+        for node_failures in fan_out(increment,
+                                     self._by_node(pending).items()):
+            failures.extend(node_failures)
+        if not failures:
+            return
+
+        # Put back only the increments that were not applied so the next
+        # flush retries them without counting the others twice
+        with self._lock:
+            for key, error in failures:
+                self._pending[key] = self._pending.get(key, 0) + pending[key]
+        raise failures[0][1]
+
+    def close(self):
+        "Stop the background flush thread and flush buffered increments"
+
+        if self._pid != os.getpid():
+            self._start()
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+
+    def delete(self):
+        "Delete all of the counter's sub-keys returning the number deleted"
+
+        with self._lock:
+            self._pending = {}
+        return sum(sum(deleted) for deleted in
+                   self._fan_out('DEL', dict.fromkeys(self.keys)))
+
+    def _fan_out(self, command, keys):
+        """
+        Run ``command`` for each key in ``keys``, a dictionary of key to
+        argument or None for no argument, with one pipeline per server
+        """
+
+        def execute(node):
+            offset, node_keys = node
+            return self._execute(offset, command, node_keys, keys)
+
+        return fan_out(execute, self._by_node(keys).items())
+
+    def _by_node(self, keys):
+        "Return ``keys`` grouped in a dictionary keyed by server offset"
+
+        nodes = {}
+        for key in keys:
+            nodes.setdefault(self.mredis.get_node_offset(key), []).append(key)
+        return nodes
+
+    def _execute(self, offset, command, node_keys, keys, raise_on_error=True):
+        """
+        Run ``command`` for each of ``node_keys`` in one pipeline on the
+        server at ``offset``, taking each key's argument from ``keys``
+        """
+
+        pipe = self.mredis.servers[offset].pipeline(transaction=False)
+        for key in node_keys:
+            if keys[key] is None:
+                pipe.execute_command(command, key)
+            else:
+                pipe.execute_command(command, key, keys[key])
+        return pipe.execute(raise_on_error=raise_on_error)
+
+    def _flush_loop(self):
+        "Flush buffered increments every flush_interval seconds"
+
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # Kept pending and retried at the next interval
+                pass
@@ -7,3 +7,6 @@ class InvalidHashMethod(Exception):
 class UnextendedRedisCommand(Exception):
     pass
 
+
+class InvalidSlotConfiguration(Exception):
+    pass
@@ -0,0 +1,337 @@
+"""
+Streaming bulk loader for MRedis.
+
+Records are read from any iterable of commands, or from a JSONL, CSV or raw
+RESP file, routed to their node with get_node_offset and sent in batches as
+per-node pipelines. Each node has its own worker thread fed by a bounded
+queue, so at most ``(window + 2) * batch_size`` records per node are held in
+memory no matter how large the input is: ``window`` queued batches, the batch
+being executed and the batch being built. A slow node applies backpressure to
+the reader instead of buffering without limit.
+
+A record is a sequence of ``command, key, *args``:
+
+    ('SET', 'user:1', 'gavin')
+    ('HSET', 'user:1:info', 'name', 'gavin')
+    ('ZADD', 'scores', 10, 'gavin')
+"""
+
+import csv
+import json
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from mredis.utils import encode_key
+
+# Sentinel telling a node worker to exit
+_STOP = object()
+
+
+class LoadReport:
+
+    def __init__(self, max_failures=1000):
+        """
+        Running totals for a bulk load. Only the first ``max_failures``
+        failed records are kept, the rest are only counted.
+        """
+
+        self.max_failures = max_failures
+        self.records = 0
+        self.batches = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.failures = []
+        self.started = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add_batch(self, records, results):
+        "Record the outcome of an executed batch"
+
+        with self._lock:
+            self.batches += 1
+            for record, result in zip(records, results):
+                if isinstance(result, Exception):
+                    self.failed += 1
+                    if len(self.failures) < self.max_failures:
+                        self.failures.append((record, result))
+                else:
+                    self.succeeded += 1
+
+    def add_failure(self, record, error):
+        "Record a single record that failed before it could be sent"
+
+        with self._lock:
+            self.failed += 1
+            if len(self.failures) < self.max_failures:
+                self.failures.append((record, error))
+
+    @property
+    def elapsed(self):
+        "Return the number of seconds the load has been running"
+
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def throughput(self):
+        "Return the number of records processed per second"
+
+        elapsed = self.elapsed
+        if not elapsed:
+            return 0.0
+        return (self.succeeded + self.failed) / elapsed
+
+    def __repr__(self):
+        return ('<LoadReport records=%i succeeded=%i failed=%i '
+                'elapsed=%.2fs throughput=%.0f/s>' %
+                (self.records, self.succeeded, self.failed, self.elapsed,
+                 self.throughput))
+
+
+class BulkLoader:
+
+    def __init__(self, mredis, batch_size=1000, window=4, max_failures=1000):
+        """
+        Expects an MRedis instance to load into.
+
+        ``batch_size`` is the number of records sent per pipeline and
+        ``window`` is the number of batches that may be queued per node
+        before the reader blocks, so up to ``(window + 2) * batch_size``
+        records per node are held in memory.
+
+        loader = mredis.BulkLoader(mr)
+        report = loader.load_file('dataset.jsonl')
+        """
+
+        if batch_size < 1 or window < 1:
+            raise ValueError('batch_size and window must be positive')
+
+        self.mredis = mredis
+        self.batch_size = batch_size
+        self.window = window
+        self.max_failures = max_failures
+
+    def load(self, records, report=None):
+        """
+        Load an iterable of ``(command, key, *args)`` records returning a
+        LoadReport once every batch has been executed
+        """
+
+        if report is None:
+            report = LoadReport(self.max_failures)
+
+        servers = self.mredis.servers
+        queues = [queue.Queue(self.window) for server in servers]
+        workers = []
+        for offset, server in enumerate(servers):
+            worker = threading.Thread(target=self._worker,
+                                      args=(server, queues[offset], report))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        batches = [[] for server in servers]
+        try:
+            for record in records:
+                report.records += 1
+                if isinstance(record, InvalidRecord):
+                    report.add_failure(record, record.error)
+                    continue
+                try:
+                    key = encode_key(record[1])
+                    offset = self.mredis.get_node_offset(key)
+                except Exception as error:
+                    report.add_failure(record, error)
+                    continue
+                batch = batches[offset]
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    queues[offset].put(batch)
+                    batches[offset] = []
+            for offset, batch in enumerate(batches):
+                if batch:
+                    queues[offset].put(batch)
+        finally:
+            for node_queue in queues:
+                node_queue.put(_STOP)
+            for worker in workers:
+                worker.join()
+            report.finished = time.time()
+
+        return report
+
+    def load_file(self, filename, format=None, report=None):
+        """
+        Load records from ``filename``. ``format`` is one of jsonl, csv or
+        resp and is guessed from the file extension when not passed.
+        """
+
+        if format is None:
+            format = filename.rsplit('.', 1)[-1].lower()
+        if format == 'json':
+            format = 'jsonl'
+        if format not in READERS:
+            raise ValueError('Unsupported bulk load format: %s' % format)
+
+        mode = 'rb' if format == 'resp' else 'r'
+        with open(filename, mode) as handle:
+            return self.load(READERS[format](handle), report)
+
+    def _worker(self, server, node_queue, report):
+        "Execute the batches queued for a single node"
+
+        while True:
+            batch = node_queue.get()
+            if batch is _STOP:
+                return
+            try:
+                pipe = server.pipeline(transaction=False)
+                for record in batch:
+                    pipe.execute_command(*record)
+                results = pipe.execute(raise_on_error=False)
+            except Exception as error:
+                results = [error] * len(batch)
+            report.add_batch(batch, results)
+
+
+class InvalidRecord(object):
+
+    def __init__(self, location, data, error):
+        """
+        Yielded by the readers in place of input that could not be parsed,
+        so the load reports it as a failed record and carries on
+        """
+
+        self.location = location
+        self.data = data
+        self.error = error
+
+    def __repr__(self):
+        return '<InvalidRecord %s %r>' % (self.location, self.data)
+
+
+def read_jsonl(handle):
+    """
+    Yield records from a file with one JSON array per line:
+
+        ["SET", "user:1", "gavin"]
+    """
+
+    for number, line in enumerate(handle, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            yield InvalidRecord('line %i' % number, line, error)
+
+
+def read_csv(handle):
+    """
+    Yield records from a CSV file with one command per row:
+
+        SET,user:1,gavin
+    """
+
+    reader = csv.reader(handle)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as error:
+            yield InvalidRecord('line %i' % reader.line_num, None, error)
+            continue
+        if row:
+            yield row
+
+
+def read_resp(handle):
+    """
+    Yield records from a raw RESP file, the same format accepted by
+    redis-cli --pipe:
+
+        *3\\r\\n$3\\r\\nSET\\r\\n$6\\r\\nuser:1\\r\\n$5\\r\\ngavin\\r\\n
+
+    A malformed stream cannot be resynchronised, so the first error is
+    yielded as an InvalidRecord and reading stops.
+    """
+
+    while True:
+        position = handle.tell()
+        line = handle.readline()
+        if not line:
+            return
+        line = line.rstrip(b'\r\n')
+        if not line:
+            continue
+        try:
+            if line[:1] != b'*':
+                raise ValueError('Expected a RESP array, got %r' % line)
+            record = []
+            for x in range(int(line[1:])):
+                header = handle.readline().rstrip(b'\r\n')
+                if header[:1] != b'$':
+                    raise ValueError('Expected a RESP bulk string, got %r' %
+                                     header)
+                length = int(header[1:])
+                value = handle.read(length)
+                if len(value) != length or handle.read(2) != b'\r\n':
+                    raise ValueError('Truncated RESP bulk string')
+                record.append(value)
+        except ValueError as error:
+            yield InvalidRecord('byte %i' % position, line, error)
+            return
+        yield record
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv, 'resp': read_resp}
+
+
+def main(argv=None):
+    "Command line entry point for bulk loading files into MRedis"
+
+    import argparse
+    from mredis.client import MRedis
+
+    parser = argparse.ArgumentParser(
+        description='Bulk load JSONL, CSV or RESP files into MRedis')
+    parser.add_argument('files', nargs='+', metavar='FILE')
+    parser.add_argument('-s', '--server', action='append', required=True,
+                        help='host:port:db, repeat once per server')
+    parser.add_argument('-f', '--format', choices=sorted(READERS),
+                        help='input format, guessed from the extension '
+                             'when omitted')
+    parser.add_argument('-b', '--batch-size', type=int, default=1000)
+    parser.add_argument('-w', '--window', type=int, default=4,
+                        help='batches queued per server')
+    args = parser.parse_args(argv)
+
+    config = []
+    for server in args.server:
+        parts = server.split(':')
+        if len(parts) > 3:
+            parser.error('Invalid server %r, expected host:port:db' % server)
+        host, port, db = parts + ['6379', '0'][len(parts) - 1:]
+        config.append({'host': host, 'port': int(port), 'db': int(db)})
+
+    loader = BulkLoader(MRedis(config), args.batch_size, args.window)
+    report = LoadReport(loader.max_failures)
+    for filename in args.files:
+        loader.load_file(filename, args.format, report)
+        sys.stdout.write('%s: %r\n' % (filename, report))
+
+    for record, error in report.failures:
+        sys.stderr.write('Failed %r: %s\n' % (record, error))
+    return 1 if report.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
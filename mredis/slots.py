@@ -0,0 +1,103 @@
+"""
+Redis Cluster compatible key slots: CRC16 (XMODEM) of the key, or of its hash
+tag, modulo 16384.
+"""
+
+from mredis.exceptions import InvalidSlotConfiguration
+
+SLOT_COUNT = 16384
+
+
+def _build_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for x in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ 0x1021
+            else:
+                crc <<= 1
+        table.append(crc & 0xffff)
+    return table
+
+CRC16_TABLE = _build_table()
+
+
+def crc16(data):
+    "Return the CRC16 (XMODEM) checksum of the bytes in ``data``"
+
+    crc = 0
+    for byte in bytearray(data):
+        crc = ((crc << 8) & 0xff00) ^ CRC16_TABLE[((crc >> 8) ^ byte) & 0xff]
+    return crc
+
+
+def key_slot(key):
+    """
+    Return the slot for ``key``. When the key contains a non-empty hash tag
+    such as ``{user:1}:name`` only the text inside the braces is hashed.
+    """
+
+    if not isinstance(key, bytes):
+        key = key.encode('utf-8')
+
+    start = key.find(b'{')
+    if start > -1:
+        end = key.find(b'}', start + 1)
+        if end > start + 1:
+            key = key[start + 1:end]
+
+    return crc16(key) % SLOT_COUNT
+
+
+def parse_slot_ranges(value):
+    """
+    Return a list of inclusive (start, end) tuples from a slot config value,
+    a list containing slot numbers, (start, end) pairs or "start-end" strings
+    """
+
+    ranges = []
+    for item in value:
+        if isinstance(item, int):
+            start = end = item
+        elif isinstance(item, (list, tuple)):
+            start, end = item
+        else:
+            start, sep, end = str(item).partition('-')
+            end = end or start
+        start, end = int(start), int(end)
+        if not 0 <= start <= end < SLOT_COUNT:
+            raise InvalidSlotConfiguration('Invalid slot range %r' % (item,))
+        ranges.append((start, end))
+    return ranges
+
+
+def build_slot_table(config):
+    """
+    Return a SLOT_COUNT entry list mapping each slot to a server offset. When
+    no server in ``config`` has a ``slots`` entry the slots are split evenly
+    in server order, otherwise every slot must be assigned to exactly one
+    server.
+    """
+
+    if not config:
+        raise InvalidSlotConfiguration('No servers to assign slots to')
+
+    if not [server for server in config if 'slots' in server]:
+        return [slot * len(config) // SLOT_COUNT
+                for slot in range(SLOT_COUNT)]
+
+    table = [None] * SLOT_COUNT
+    for offset, server in enumerate(config):
+        for start, end in parse_slot_ranges(server.get('slots', [])):
+            for slot in range(start, end + 1):
+                if table[slot] not in (None, offset):
+                    raise InvalidSlotConfiguration(
+                        'Slot %i is assigned to servers %i and %i' %
+                        (slot, table[slot], offset))
+                table[slot] = offset
+
+    if None in table:
+        raise InvalidSlotConfiguration('Slot %i is not assigned to a server' %
+                                       table.index(None))
+    return table
@@ -0,0 +1,129 @@
+"""
+Snapshot export and restore for the whole keyspace behind an MRedis instance.
+
+Export SCANs every node in parallel, pipelines DUMP and PTTL for each batch of
+keys and appends the results to a single length-prefixed file. Restore
+memory-maps that file and sends RESTORE commands through BulkLoader, so each
+key is routed with get_node_offset of the target instance and a snapshot can
+be restored onto a different number of servers or a different hash method.
+
+The file starts with MAGIC followed by one record per key:
+
+    key length (uint32) | value length (uint32) | pttl (int64) | key | value
+
+All integers are big-endian, a pttl of -1 means the key does not expire.
+"""
+
+import mmap
+import struct
+import threading
+
+from mredis.loader import BulkLoader
+from mredis.utils import fan_out
+
+MAGIC = b'MRSNAP\x00\x01'
+HEADER = struct.Struct('>IIq')
+
+
+def export_snapshot(mredis, filename, pattern='*', batch_size=1000):
+    """
+    Write every key matching ``pattern`` on every server to ``filename``
+    returning the number of keys exported in a dictionary keyed by server
+    """
+
+    lock = threading.Lock()
+
+    with open(filename, 'wb') as handle:
+        handle.write(MAGIC)
+
+        def export_node(server):
+            exported = 0
+            batch = []
+            for key in server.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    exported += _export_batch(server, batch, handle, lock)
+                    batch = []
+            if batch:
+                exported += _export_batch(server, batch, handle, lock)
+            return exported
+
+        servers = mredis.servers
+        counts = fan_out(export_node, servers)
+
+    response = {}
+    for server, count in zip(servers, counts):
+        response[mredis.get_server_key(server)] = count
+    return response
+
+
+def _export_batch(server, keys, handle, lock):
+    "Pipeline DUMP and PTTL for ``keys`` and append them to the snapshot"
+
+    pipe = server.pipeline(transaction=False)
+    for key in keys:
+        pipe.execute_command('DUMP', key)
+        pipe.execute_command('PTTL', key)
+    results = pipe.execute()
+
+    chunks = []
+    for offset, key in enumerate(keys):
+        value, pttl = results[offset * 2], results[offset * 2 + 1]
+
+        # The key was deleted or expired between SCAN and DUMP
+        if value is None or pttl == -2:
+            continue
+
+        if not isinstance(key, bytes):
+            key = key.encode('utf-8')
+        chunks.append(HEADER.pack(len(key), len(value), pttl))
+        chunks.append(key)
+        chunks.append(value)
+
+    with lock:
+        handle.write(b''.join(chunks))
+    return len(chunks) // 3
+
+
+def read_snapshot(filename):
+    "Yield (key, pttl, value) for each record in the snapshot ``filename``"
+
+    with open(filename, 'rb') as handle:
+        data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError('%s is not an MRedis snapshot' % filename)
+            position = len(MAGIC)
+            size = len(data)
+            while position < size:
+                key_length, value_length, pttl = \
+                    HEADER.unpack_from(data, position)
+                position += HEADER.size
+                key = data[position:position + key_length]
+                position += key_length
+                value = data[position:position + value_length]
+                position += value_length
+                yield key, pttl, value
+        finally:
+            data.close()
+
+
+def import_snapshot(mredis, filename, replace=False, batch_size=1000,
+                    window=4):
+    """
+    RESTORE every key in ``filename`` onto the servers behind ``mredis``
+    returning a LoadReport. Existing keys fail to restore unless ``replace``
+    is True.
+    """
+
+    def records():
+        for key, pttl, value in read_snapshot(filename):
+            # RESTORE treats a ttl of 0 as persistent
+            ttl = 0 if pttl < 0 else max(pttl, 1)
+            record = ['RESTORE', key, ttl, value]
+            if replace:
+                record.append('REPLACE')
+            yield record
+
+    loader = BulkLoader(mredis, batch_size, window)
+    return loader.load(records())
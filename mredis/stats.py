@@ -0,0 +1,159 @@
+"""
+Sampled key and server statistics for spotting hot keys and shard skew.
+
+A count-min sketch estimates how often each sampled key was routed and a
+small top-K heap keeps the keys with the highest estimates, so memory use is
+fixed regardless of the number of distinct keys. Per-server counters track the
+sampled requests and key bytes routed to each server.
+"""
+
+from hashlib import md5
+import heapq
+import struct
+import threading
+
+_WORDS = struct.Struct('>4I')
+
+
+class CountMinSketch:
+
+    def __init__(self, width=2048, depth=4):
+        """
+        Estimate key frequencies in ``width * depth`` counters, ``depth`` may
+        be at most 4
+        """
+
+        if not 0 < depth <= 4:
+            raise ValueError('depth must be between 1 and 4')
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for x in range(depth)]
+
+    def add(self, key, count=1):
+        "Add ``count`` to ``key`` returning its new estimated count"
+
+        estimate = None
+        for row, column in zip(self.rows, self._columns(key)):
+            row[column] += count
+            if estimate is None or row[column] < estimate:
+                estimate = row[column]
+        return estimate
+
+    def estimate(self, key):
+        "Return the estimated count for ``key``"
+
+        return min(row[column]
+                   for row, column in zip(self.rows, self._columns(key)))
+
+    def _columns(self, key):
+        """
+        Return the column for ``key`` in each row, each row using its own
+        32 bits of the key's md5 digest so the rows are independent
+        """
+
+        return [word % self.width
+                for word in _WORDS.unpack(md5(key).digest())[:self.depth]]
+
+
+class TopKeys:
+
+    def __init__(self, size=32):
+        "Track the ``size`` keys with the highest counts"
+
+        self.size = size
+        self.heap = []
+        self.entries = {}
+        self.dirty = False
+
+    def update(self, key, count):
+        "Offer ``key`` with its current estimated ``count``"
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[0] = count
+            self.dirty = True
+            return
+
+        if len(self.heap) < self.size:
+            entry = [count, key]
+            self.entries[key] = entry
+            heapq.heappush(self.heap, entry)
+            return
+
+        if self.dirty:
+            heapq.heapify(self.heap)
+            self.dirty = False
+        if count > self.heap[0][0]:
+            entry = [count, key]
+            del self.entries[heapq.heapreplace(self.heap, entry)[1]]
+            self.entries[key] = entry
+
+    def items(self):
+        "Return the tracked (key, count) pairs, highest count first"
+
+        return [(key, count) for count, key in sorted(self.heap,
+                                                      reverse=True)]
+
+
+class KeyStats:
+
+    def __init__(self, servers, sample_rate, top_keys=32, width=2048,
+                 depth=4):
+        """
+        Collect statistics for keys routed to ``servers`` servers, where
+        ``sample_rate`` is the fraction of routed keys that are recorded
+        """
+
+        self.servers = servers
+        self.sample_rate = sample_rate
+        self.top_keys = top_keys
+        self.width = width
+        self.depth = depth
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        "Clear all collected statistics"
+
+        with self.lock:
+            self.sketch = CountMinSketch(self.width, self.depth)
+            self.top = TopKeys(self.top_keys)
+            self.requests = [0] * self.servers
+            self.bytes = [0] * self.servers
+
+    def record(self, key, offset):
+        "Record a sampled ``key`` routed to the server at ``offset``"
+
+        if not isinstance(key, bytes):
+            key = str(key).encode('utf-8')
+        with self.lock:
+            self.requests[offset] += 1
+            self.bytes[offset] += len(key)
+            self.top.update(key, self.sketch.add(key))
+
+    def hot_keys(self, count=10):
+        """
+        Return up to ``count`` (key, estimated requests) pairs for the
+        hottest sampled keys, scaled up by the sample rate
+        """
+
+        with self.lock:
+            items = self.top.items()[:count]
+        return [(key, int(estimate / self.sample_rate))
+                for key, estimate in items]
+
+    def node_stats(self):
+        """
+        Return a list of (estimated requests, estimated key bytes) per server
+        offset and the imbalance ratio of the busiest server to the mean
+        """
+
+        with self.lock:
+            requests = list(self.requests)
+            key_bytes = list(self.bytes)
+
+        mean = float(sum(requests)) / len(requests) if requests else 0.0
+        imbalance = max(requests) / mean if mean else 0.0
+        nodes = [(int(count / self.sample_rate), int(size / self.sample_rate))
+                 for count, size in zip(requests, key_bytes)]
+        return nodes, imbalance
@@ -0,0 +1,44 @@
+"Helpers shared by the MRedis multi-server operations."
+
+import threading
+
+
+def encode_key(key):
+    "Return ``key`` as bytes, the form the crc32 based routing expects"
+
+    if isinstance(key, bytes):
+        return key
+    if not hasattr(key, 'encode'):
+        key = str(key)
+    return key.encode('utf-8')
+
+
+def fan_out(function, items):
+    """
+    Call ``function`` with each item in its own thread, returning the results
+    in the same order as ``items``. The first exception raised by any call is
+    re-raised once every thread has finished.
+    """
+
+    items = list(items)
+    results = [None] * len(items)
+    errors = []
+
+    def run(index, item):
+        try:
+            results[index] = function(item)
+        except Exception as error:
+            errors.append(error)
+
+    threads = []
+    for index, item in enumerate(items):
+        thread = threading.Thread(target=run, args=(index, item))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
@@ -15,4 +15,5 @@ setup(name='MRedis',
       url="http://github.com/gmr/mredis",
       packages=['mredis'],
       install_requires = ['redis'],
+      entry_points={'console_scripts': ['mredis-load = mredis.loader:main']},
       zip_safe=True)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+
+import mredis
+import time
+
+ports = [6379, 6380]
+
+servers = []
+for port in ports:
+    servers.append({'host': 'localhost', 'port': port, 'db': 0})
+
+mr = mredis.MRedis(servers)
+
+# Build a stream of records without holding them in memory
+records = (('SET', 'bulk:%i' % x, time.time()) for x in range(0, 100000))
+
+loader = mredis.BulkLoader(mr, batch_size=1000, window=4)
+report = loader.load(records)
+print(report)
+
+# Commands that fail are reported per record
+report = loader.load([('SET', 'bulk:ok', 1), ('INCR', 'bulk:ok', 'bogus')])
+print('%i failed: %r' % (report.failed, report.failures))
+
+print(mr.dbsize())
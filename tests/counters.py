@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+import mredis
+import threading
+import time
+
+servers = [{'host': 'localhost', 'port': 6379, 'db': 0},
+           {'host': 'localhost', 'port': 6380, 'db': 0}]
+
+mr = mredis.MRedis(servers)
+
+# Sub-keys are placed with the default crc32 hash method on every server
+counter = mredis.ShardedCounter(mr, 'counters:placement', 4)
+print(counter.keys)
+print(sorted(set(mr.get_node_offset(key) for key in counter.keys)))
+
+counter = mredis.ShardedCounter(mr, 'counters:direct', 4)
+start = time.time()
+for x in range(0, 1000):
+    counter.incr()
+print('Direct    : %.8f' % (time.time() - start))
+print(counter.get())
+
+# Buffered increments from several threads
+counter = mredis.ShardedCounter(mr, 'counters:buffered', 4, 'thread', 0.1)
+
+
+def increment():
+    for x in range(0, 1000):
+        counter.incr()
+
+threads = [threading.Thread(target=increment) for x in range(0, 4)]
+start = time.time()
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+counter.close()
+print('Buffered  : %.8f' % (time.time() - start))
+print(counter.get())
+
+counter.delete()
+mredis.ShardedCounter(mr, 'counters:direct', 4).delete()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+
+import mredis
+import os
+import time
+
+servers = [{'host': 'localhost', 'port': 6379, 'db': 0},
+           {'host': 'localhost', 'port': 6380, 'db': 0}]
+
+mr = mredis.MRedis(servers)
+mr.set('fork:parent', os.getpid())
+
+for x in range(0, 4):
+    if not os.fork():
+        # Each child gets its own connections the first time it uses them
+        start = time.time()
+        print(mr.warm_up(2))
+        print('Warm up   : %.8f' % (time.time() - start))
+        mr.set('fork:%i' % os.getpid(), mr.get('fork:parent'))
+        os._exit(0)
+
+for x in range(0, 4):
+    os.wait()
+
+print(mr.get('fork:parent'))
+print(mr.keys('fork:*'))
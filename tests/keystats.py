@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+
+import mredis
+import random
+
+servers = [{'host': 'localhost', 'port': 6379, 'db': 0},
+           {'host': 'localhost', 'port': 6380, 'db': 0}]
+
+mr = mredis.MRedis(servers, sample_rate=0.1)
+
+# One hot key among many cold ones
+for x in range(0, 10000):
+    if random.random() < 0.2:
+        mr.incr('keystats:hot')
+    else:
+        mr.get('keystats:%i' % random.randint(0, 10000))
+
+stats = mr.get_key_stats(5)
+print(stats['hot_keys'])
+print(stats['servers'])
+print('Imbalance : %.2f' % stats['imbalance'])
+
+mr.delete('keystats:hot')
@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+
+import mredis
+
+servers = [{'host': 'localhost', 'port': 6379, 'db': 0, 'slots': ['0-8191']},
+           {'host': 'localhost', 'port': 6380, 'db': 0,
+            'slots': ['8192-16383']}]
+
+mr = mredis.MRedis(servers, 'slots')
+
+# Known Redis Cluster slots
+print('%i %i' % (mr.get_slot('foo'), mr.get_slot('bar')))
+
+# Keys sharing a hash tag land on the same server
+for x in range(0, 100):
+    mr.set('{user:1}:%i' % x, x)
+print(mr.get_slot_counts('{user:1}:*'))
+
+mr.assign_slots(0, 99, 1)
+print(mr.get_slot_ranges())
+
+for x in range(0, 100):
+    mr.delete('{user:1}:%i' % x)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+
+import mredis
+import time
+
+servers = [{'host': 'localhost', 'port': 6379, 'db': 0},
+           {'host': 'localhost', 'port': 6380, 'db': 0}]
+
+mr = mredis.MRedis(servers)
+
+for x in range(0, 1000):
+    mr.set('snapshot:%i' % x, time.time())
+
+start = time.time()
+print(mredis.export_snapshot(mr, '/tmp/mredis.snap', 'snapshot:*'))
+print('Export    : %.8f' % (time.time() - start))
+
+# Restore onto a single server in a different database
+target = mredis.MRedis([{'host': 'localhost', 'port': 6379, 'db': 1}])
+
+start = time.time()
+print(mredis.import_snapshot(target, '/tmp/mredis.snap', replace=True))
+print('Import    : %.8f' % (time.time() - start))
+
+print(target.dbsize())